@@ -4,24 +4,146 @@
 
 import os
 import json
+import asyncio
+import logging
+import time
 from datetime import datetime
+from email.utils import parsedate_to_datetime
+from functools import lru_cache, partial
+from pathlib import Path
+from tempfile import gettempdir
 from typing import Dict, List, Optional, Any
-import requests
+import httpx
+import orjson
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
-load_dotenv()
+@lru_cache(maxsize=1)
+def _load_env() -> bool:
+    load_dotenv()
+    return True
+
+_load_env()
+
+log = logging.getLogger("kanairy.appwrite")
+
+# Environment-derived settings, resolved once per process
+PROJECT_ID = os.environ.get("APPWRITE_PROJECT_ID", "")
+API_KEY = os.environ.get("APPWRITE_API_KEY", "")
+ENDPOINT = os.environ.get("APPWRITE_ENDPOINT", "https://cloud.appwrite.io/v1")
+
+DATABASE_ID = os.environ.get("APPWRITE_DATABASE_ID", "kanairy_db")
+USERS_COLLECTION_ID = os.environ.get("APPWRITE_USERS_COLLECTION_ID", "users")
+POSITIONS_COLLECTION_ID = os.environ.get("APPWRITE_POSITIONS_COLLECTION_ID", "positions")
+ORDERS_COLLECTION_ID = os.environ.get("APPWRITE_ORDERS_COLLECTION_ID", "orders")
+NEWS_COLLECTION_ID = os.environ.get("APPWRITE_NEWS_COLLECTION_ID", "news")
+
+# Retry policy for transient gateway errors (mirrors urllib3's Retry defaults:
+# only idempotent methods are retried on a bad status). A 429 means the request
+# was rejected before it ran, so it is retried for any method.
+RETRY_TOTAL = 5
+RETRY_BACKOFF_FACTOR = 0.3
+RETRY_STATUSES = {429, 502, 503, 504}
+RETRY_METHODS = {"GET", "PUT", "DELETE"}
+RETRY_AFTER_MAX = 30  # seconds; caps server-requested waits
+
+# Circuit breaker - stop calling Appwrite after repeated failures
+BREAKER_FAIL_MAX = 5
+BREAKER_RESET_TIMEOUT = 30  # seconds
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header, if present"""
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        delay = float(value)
+    except ValueError:
+        try:
+            delay = parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
+    return min(max(delay, 0.0), RETRY_AFTER_MAX)
+
+class CircuitBreaker:
+    """Opens after fail_max consecutive failures and lets calls through again after reset_timeout"""
+    
+    def __init__(self, fail_max: int, reset_timeout: float):
+        self.fail_max = fail_max
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+    
+    def allow(self) -> bool:
+        return self._opened_at is None or time.monotonic() - self._opened_at >= self.reset_timeout
+    
+    def record_success(self):
+        self._failures = 0
+        self._opened_at = None
+    
+    def record_failure(self):
+        self._failures += 1
+        if self._failures >= self.fail_max:
+            if self._opened_at is None:
+                log.warning("⚠️ Appwrite circuit opened after %d consecutive failures", self._failures)
+            self._opened_at = time.monotonic()
+
+# Query templates; values are JSON-quoted so quotes in user input can't break out
+_quote = partial(json.dumps, ensure_ascii=False)  # Appwrite's query parser doesn't decode \uXXXX escapes
+_EQ = 'equal("{}", {})'.format
+_EQ_USER = 'equal("user_id", {})'.format
+_EQ_STATUS = 'equal("status", {})'.format
+_LIMIT = 'limit({})'.format  # Page size goes in queries; listDocuments has no limit parameter
+_CURSOR_AFTER = 'cursorAfter({})'.format
+
+def _equal(attribute: str, value: Any) -> str:
+    """Build an Appwrite equal() query"""
+    return _EQ(attribute, _quote(value))
+
+# Schema provisioning
+PROVISION_CONCURRENCY = 10
+ATTRIBUTE_TYPES = {"string", "double", "integer", "datetime", "boolean"}
+
+# Marker written after a successful schema bootstrap; bump the version whenever
+# collections_config changes so existing markers stop matching
+BOOTSTRAP_VERSION = "v2"
+
+# Users attributes from before passwords were stored as one blob; existing
+# collections still mark them required, so they are relaxed on bootstrap
+LEGACY_USER_ATTRIBUTES = ("iv", "auth_tag")
+BOOTSTRAP_MARKER = Path(gettempdir()) / f".kanairy_bootstrap_{BOOTSTRAP_VERSION}_{PROJECT_ID}_{DATABASE_ID}"
+
+# Read caches for rarely-changing documents
+USER_CACHE_TTL = 60  # seconds
+NEWS_CACHE_TTL = 60
+
+# Max in-flight single-document creates when the bulk endpoint is unavailable
+BULK_FALLBACK_CONCURRENCY = 20
+# Bulk-create responses meaning the server doesn't support the bulk shape, so single creates are safe
+BULK_UNSUPPORTED_STATUSES = (400, 404, 405)
 
 class AppwriteClient:
     def __init__(self):
-        self.project_id = os.getenv("APPWRITE_PROJECT_ID", "")
-        self.api_key = os.getenv("APPWRITE_API_KEY", "")
-        self.endpoint = os.getenv("APPWRITE_ENDPOINT", "https://cloud.appwrite.io/v1")
+        self.project_id = PROJECT_ID
+        self.api_key = API_KEY
+        self.endpoint = ENDPOINT
+        
+        self.database_id = DATABASE_ID
+        self.users_collection_id = USERS_COLLECTION_ID
+        self.positions_collection_id = POSITIONS_COLLECTION_ID
+        self.orders_collection_id = ORDERS_COLLECTION_ID
+        self.news_collection_id = NEWS_COLLECTION_ID
         
-        self.database_id = os.getenv("APPWRITE_DATABASE_ID", "kanairy_db")
-        self.users_collection_id = os.getenv("APPWRITE_USERS_COLLECTION_ID", "users")
-        self.positions_collection_id = os.getenv("APPWRITE_POSITIONS_COLLECTION_ID", "positions")
-        self.orders_collection_id = os.getenv("APPWRITE_ORDERS_COLLECTION_ID", "orders")
-        self.news_collection_id = os.getenv("APPWRITE_NEWS_COLLECTION_ID", "news")
+        # Document paths, built once instead of per call
+        self._collections = f"/databases/{self.database_id}/collections"
+        self._users_docs = f"{self._collections}/{self.users_collection_id}/documents"
+        self._positions_docs = f"{self._collections}/{self.positions_collection_id}/documents"
+        self._orders_docs = f"{self._collections}/{self.orders_collection_id}/documents"
+        self._news_docs = f"{self._collections}/{self.news_collection_id}/documents"
+        self._users_doc = self._users_docs + "/{}"
+        self._positions_doc = self._positions_docs + "/{}"
+        self._orders_doc = self._orders_docs + "/{}"
+        self._news_doc = self._news_docs + "/{}"
         
         self.headers = {
             "Content-Type": "application/json",
@@ -29,59 +151,104 @@ class AppwriteClient:
             "X-Appwrite-Key": self.api_key
         }
         
-        print(f"🔗 Appwrite Client Initialized")
-        print(f"   Endpoint: {self.endpoint}")
-        print(f"   Project ID: {self.project_id[:20]}...")
+        self._db_initialized = False
+        # Caps in-flight schema requests so provisioning stays under Appwrite rate limits
+        self._provision_limit = asyncio.Semaphore(PROVISION_CONCURRENCY)
+        self._bulk_limit = asyncio.Semaphore(BULK_FALLBACK_CONCURRENCY)
+        self._breaker = CircuitBreaker(BREAKER_FAIL_MAX, BREAKER_RESET_TIMEOUT)
         
-        # Initialize database and collections
-        self.initialize_database()
+        # Hot read paths: user_id -> user, (broker_account, server) -> user, (category, limit) -> news
+        self._user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+        self._broker_account_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+        self._user_broker_keys = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)  # user_id -> its _broker_account_cache key
+        self._news_cache = TTLCache(maxsize=128, ttl=NEWS_CACHE_TTL)
+        # In-flight user fetches, so concurrent cache misses share one request
+        self._user_fetches: Dict[str, asyncio.Task] = {}
+        
+        # Shared connection pool - keeps TCP/TLS sessions to Appwrite alive between calls
+        # (the transport also retries failed connection attempts)
+        self._client = httpx.AsyncClient(
+            base_url=self.endpoint,
+            headers=self.headers,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+                retries=RETRY_TOTAL
+            ),
+            timeout=30.0
+        )
+        
+        log.info("🔗 Appwrite Client Initialized (endpoint: %s, project: %s...)", self.endpoint, self.project_id[:20])
     
-    def _make_request(self, method: str, path: str, data: dict = None, params: dict = None) -> dict:
+    async def aclose(self):
+        """Close the underlying HTTP connection pool"""
+        await self._client.aclose()
+    
+    async def _make_request(self, method: str, path: str, data: dict = None, params: dict = None) -> dict:
         """Make HTTP request to Appwrite API"""
-        url = f"{self.endpoint}{path}"
+        if method not in ("GET", "POST", "PUT", "DELETE", "PATCH"):
+            raise ValueError(f"Unsupported method: {method}")
+        
+        if not self._breaker.allow():
+            return {"error": "Appwrite unavailable (circuit open)"}
+        
+        # orjson encodes/decodes bodies; the JSON Content-Type is already a default header
+        content = orjson.dumps(data) if data is not None else None
         
         try:
-            if method == "GET":
-                response = requests.get(url, headers=self.headers, params=params)
-            elif method == "POST":
-                response = requests.post(url, headers=self.headers, json=data)
-            elif method == "PUT":
-                response = requests.put(url, headers=self.headers, json=data)
-            elif method == "DELETE":
-                response = requests.delete(url, headers=self.headers, params=params)
-            elif method == "PATCH":
-                response = requests.patch(url, headers=self.headers, json=data)
+            for attempt in range(RETRY_TOTAL + 1):
+                response = await self._client.request(method, path, content=content, params=params)
+                if (
+                    response.status_code not in RETRY_STATUSES
+                    or (method not in RETRY_METHODS and response.status_code != 429)
+                    or attempt == RETRY_TOTAL
+                ):
+                    break
+                delay = _retry_after(response)
+                await asyncio.sleep(delay if delay is not None else RETRY_BACKOFF_FACTOR * (2 ** attempt))
+            
+            if response.status_code in RETRY_STATUSES:
+                self._breaker.record_failure()
             else:
-                raise ValueError(f"Unsupported method: {method}")
+                self._breaker.record_success()
             
             response.raise_for_status()
-            return response.json() if response.content else {}
-        except requests.exceptions.RequestException as e:
-            print(f"❌ Appwrite API Error: {e}")
-            if hasattr(e, 'response') and e.response:
-                print(f"   Response: {e.response.text}")
+            return orjson.loads(response.content) if response.content else {}
+        except httpx.HTTPError as e:
+            if isinstance(e, httpx.TransportError):
+                self._breaker.record_failure()
+            
+            if isinstance(e, httpx.HTTPStatusError):
+                log.error("❌ Appwrite API Error: %s - response: %s", e, e.response.text)
+                return {"error": str(e), "status": e.response.status_code}
+            log.error("❌ Appwrite API Error: %s", e)
             return {"error": str(e)}
     
-    def initialize_database(self):
+    async def initialize_database(self):
         """Initialize database and collections if they don't exist"""
+        if self._db_initialized:
+            return
+        
+        # Schema already bootstrapped by an earlier run - skip discovery entirely
+        if BOOTSTRAP_MARKER.exists():
+            self._db_initialized = True
+            return
+        
         try:
             # Create database if it doesn't exist
-            databases = self._make_request("GET", "/databases")
+            databases = await self._make_request("GET", "/databases")
+            ok = "error" not in databases
             
             # Check if our database exists
-            db_exists = False
-            if "databases" in databases:
-                for db in databases["databases"]:
-                    if db.get("$id") == self.database_id:
-                        db_exists = True
-                        break
+            db_exists = any(db.get("$id") == self.database_id for db in databases.get("databases", []))
             
             if not db_exists:
-                print(f"📦 Creating database: {self.database_id}")
-                self._make_request("POST", "/databases", {
+                log.info("📦 Creating database: %s", self.database_id)
+                result = await self._make_request("POST", "/databases", {
                     "databaseId": self.database_id,
                     "name": "KanAIRY Trading Database"
                 })
+                ok = ok and "error" not in result
             
             # Create collections
             collections_config = [
@@ -91,9 +258,7 @@ class AppwriteClient:
                     "permissions": ["read('any')", "write('any')"],
                     "attributes": [
                         {"key": "broker_account", "type": "string", "size": 100, "required": True},
-                        {"key": "encrypted_password", "type": "string", "size": 500, "required": True},
-                        {"key": "iv", "type": "string", "size": 100, "required": True},
-                        {"key": "auth_tag", "type": "string", "size": 100, "required": True},
+                        {"key": "encrypted_password", "type": "string", "size": 1024, "required": True},
                         {"key": "server", "type": "string", "size": 100, "required": True},
                         {"key": "broker", "type": "string", "size": 50, "required": True},
                         {"key": "account_type", "type": "string", "size": 20, "required": True},
@@ -156,116 +321,226 @@ class AppwriteClient:
                 }
             ]
             
-            for config in collections_config:
-                collection_id = config["id"]
-                
-                # Check if collection exists
-                collections = self._make_request("GET", f"/databases/{self.database_id}/collections")
-                collection_exists = False
-                
-                if "collections" in collections:
-                    for col in collections["collections"]:
-                        if col.get("$id") == collection_id:
-                            collection_exists = True
-                            break
-                
-                if not collection_exists:
-                    print(f"📄 Creating collection: {config['name']}")
-                    collection_data = {
-                        "collectionId": collection_id,
-                        "name": config["name"],
-                        "permissions": config["permissions"]
-                    }
-                    
-                    # Create collection
-                    self._make_request("POST", f"/databases/{self.database_id}/collections", collection_data)
-                    
-                    # Add attributes
-                    for attr in config["attributes"]:
-                        attr_type = attr["type"]
-                        attr_key = attr["key"]
-                        
-                        if attr_type == "string":
-                            self._make_request("POST", f"/databases/{self.database_id}/collections/{collection_id}/attributes/string", {
-                                "key": attr_key,
-                                "size": attr["size"],
-                                "required": attr["required"]
-                            })
-                        elif attr_type == "double":
-                            self._make_request("POST", f"/databases/{self.database_id}/collections/{collection_id}/attributes/double", {
-                                "key": attr_key,
-                                "required": attr["required"]
-                            })
-                        elif attr_type == "integer":
-                            self._make_request("POST", f"/databases/{self.database_id}/collections/{collection_id}/attributes/integer", {
-                                "key": attr_key,
-                                "required": attr["required"]
-                            })
-                        elif attr_type == "datetime":
-                            self._make_request("POST", f"/databases/{self.database_id}/collections/{collection_id}/attributes/datetime", {
-                                "key": attr_key,
-                                "required": attr["required"]
-                            })
-                        elif attr_type == "boolean":
-                            self._make_request("POST", f"/databases/{self.database_id}/collections/{collection_id}/attributes/boolean", {
-                                "key": attr_key,
-                                "required": attr["required"]
-                            })
+            # Fetch existing collections once instead of once per collection
+            collections = await self._make_request("GET", self._collections)
+            existing = {col.get("$id"): col for col in collections.get("collections", [])}
+            existing_ids = existing.keys()
+            ok = ok and "error" not in collections
             
-            print("✅ Database initialization complete")
+            # Collections created by older versions may need their schema migrated
+            if self.users_collection_id in existing:
+                ok = await self._migrate_users_collection(existing[self.users_collection_id]) and ok
+            
+            # Provision missing collections concurrently
+            created = await asyncio.gather(*[
+                self._create_collection(config)
+                for config in collections_config
+                if config["id"] not in existing_ids
+            ])
+            
+            self._db_initialized = True
+            log.info("✅ Database initialization complete")
+            
+            if ok and all(created):
+                try:
+                    BOOTSTRAP_MARKER.touch()
+                except OSError as e:
+                    log.warning("⚠️ Could not write bootstrap marker: %s", e)
             
         except Exception as e:
-            print(f"⚠️ Database initialization error: {e}")
+            log.exception("⚠️ Database initialization error: %s", e)
+    
+    async def _migrate_users_collection(self, collection: Dict) -> bool:
+        """Make legacy iv/auth_tag attributes optional so blob-only users can be created"""
+        legacy = [
+            attr["key"] for attr in collection.get("attributes", [])
+            if attr.get("key") in LEGACY_USER_ATTRIBUTES and attr.get("required")
+        ]
+        
+        async def relax(key: str) -> bool:
+            log.info("🔧 Making users.%s optional", key)
+            async with self._provision_limit:
+                result = await self._make_request(
+                    "PATCH",
+                    f"{self._collections}/{self.users_collection_id}/attributes/string/{key}",
+                    {"required": False, "default": None}
+                )
+            return "error" not in result
+        
+        return all(await asyncio.gather(*[relax(key) for key in legacy]))
+    
+    async def _create_collection(self, config: Dict) -> bool:
+        """Create a collection and all of its attributes; returns True if every request succeeded"""
+        collection_id = config["id"]
+        log.info("📄 Creating collection: %s", config["name"])
+        collection_data = {
+            "collectionId": collection_id,
+            "name": config["name"],
+            "permissions": config["permissions"]
+        }
+        
+        # Create collection
+        async with self._provision_limit:
+            result = await self._make_request("POST", self._collections, collection_data)
+        
+        # Add attributes
+        created = await asyncio.gather(*[self._create_attribute(collection_id, attr) for attr in config["attributes"]])
+        return "error" not in result and all(created)
+    
+    async def _create_attribute(self, collection_id: str, attr: Dict) -> bool:
+        """Create a single collection attribute"""
+        attr_type = attr["type"]
+        if attr_type not in ATTRIBUTE_TYPES:
+            return True
+        
+        attr_data = {"key": attr["key"], "required": attr["required"]}
+        if attr_type == "string":
+            attr_data["size"] = attr["size"]
+        
+        async with self._provision_limit:
+            result = await self._make_request("POST", f"{self._collections}/{collection_id}/attributes/{attr_type}", attr_data)
+        return "error" not in result
+    
+    async def _create_document(self, documents_path: str, data: Dict, document_id: str = "unique()") -> Dict:
+        """Create one document; Appwrite generates the ID unless one is given"""
+        return await self._make_request("POST", documents_path, {"documentId": document_id, "data": data})
+    
+    async def _update_document(self, document_path: str, data: Dict) -> Dict:
+        """Update fields of one document; Appwrite expects the fields wrapped in a data key"""
+        return await self._make_request("PATCH", document_path, {"data": data})
+    
+    async def _bulk_create(self, documents_path: str, documents: List[Dict], create_one) -> List[Dict]:
+        """Create many documents in one request, falling back to concurrent single creates
+        
+        Only a server that rejects the bulk shape gets the fallback; any other
+        failure (timeout, 5xx, circuit open) is returned as the only item, since
+        the bulk write may already have been applied.
+        """
+        if not documents:
+            return []
+        
+        result = await self._make_request("POST", documents_path, {"documents": documents})
+        if "error" not in result:
+            return result.get("documents", [])
+        if result.get("status") not in BULK_UNSUPPORTED_STATUSES:
+            return [result]
+        
+        # Servers without the bulk endpoint - fan out single-document creates instead
+        async def create(document: Dict) -> Dict:
+            async with self._bulk_limit:
+                return await create_one(document)
+        
+        return await asyncio.gather(*[create(document) for document in documents])
     
     # ========== USER OPERATIONS ==========
     
-    def create_user(self, user_data: Dict) -> Dict:
+    async def create_user(self, user_data: Dict) -> Dict:
         """Create a new user"""
-        return self._make_request("POST", f"/databases/{self.database_id}/collections/{self.users_collection_id}/documents", user_data)
+        return await self._create_document(self._users_docs, user_data)
     
-    def get_user_by_broker_account(self, broker_account: str, server: str) -> Optional[Dict]:
+    async def list_users(self, page_size: int = 100) -> List[Dict]:
+        """List every user, paging through the collection"""
+        users: List[Dict] = []
+        queries = [_LIMIT(page_size)]
+        while True:
+            result = await self._make_request("GET", self._users_docs, params={"queries": queries})
+            page = result.get("documents", [])
+            users.extend(page)
+            if len(page) < page_size:
+                return users
+            queries = [_LIMIT(page_size), _CURSOR_AFTER(_quote(page[-1]["$id"]))]
+    
+    async def get_user_by_broker_account(self, broker_account: str, server: str) -> Optional[Dict]:
         """Get user by broker account and server"""
-        result = self._make_request("GET", f"/databases/{self.database_id}/collections/{self.users_collection_id}/documents", params={
+        key = (broker_account, server)
+        if key in self._broker_account_cache:
+            return self._broker_account_cache[key]
+        
+        result = await self._make_request("GET", self._users_docs, params={
             "queries": [
-                f"equal(\"broker_account\", \"{broker_account}\")",
-                f"equal(\"server\", \"{server}\")"
-            ],
-            "limit": 1
+                _equal("broker_account", broker_account),
+                _equal("server", server),
+                _LIMIT(1)
+            ]
         })
         
         if "documents" in result and len(result["documents"]) > 0:
-            return result["documents"][0]
+            user = result["documents"][0]
+            self._broker_account_cache[key] = user
+            self._user_broker_keys[user["$id"]] = key
+            self._user_cache[user["$id"]] = user
+            return user
         return None
     
-    def get_user_by_id(self, user_id: str) -> Optional[Dict]:
+    async def get_user_by_id(self, user_id: str) -> Optional[Dict]:
         """Get user by ID"""
+        if user_id in self._user_cache:
+            return self._user_cache[user_id]
+        
+        fetch = self._user_fetches.get(user_id)
+        if fetch is None:
+            fetch = asyncio.ensure_future(self._fetch_user(user_id))
+            self._user_fetches[user_id] = fetch
+            fetch.add_done_callback(lambda done: self._forget_fetch(user_id, done))
+        return await asyncio.shield(fetch)
+    
+    def _forget_fetch(self, user_id: str, fetch: asyncio.Task):
+        """Unregister a finished fetch unless a newer one has replaced it"""
+        if self._user_fetches.get(user_id) is fetch:
+            del self._user_fetches[user_id]
+    
+    async def _fetch_user(self, user_id: str) -> Optional[Dict]:
         try:
-            return self._make_request("GET", f"/databases/{self.database_id}/collections/{self.users_collection_id}/documents/{user_id}")
+            user = await self._make_request("GET", self._users_doc.format(user_id))
         except:
             return None
+        
+        if "error" in user:
+            return None
+        
+        # An invalidation while this was in flight unregisters it; don't cache a possibly stale copy
+        if self._user_fetches.get(user_id) is asyncio.current_task():
+            self._user_cache[user_id] = user
+        return user
     
-    def update_user(self, user_id: str, update_data: Dict) -> Dict:
+    def _invalidate_user(self, user_id: str):
+        """Drop cached copies of a user after it changes"""
+        self._user_cache.pop(user_id, None)
+        self._user_fetches.pop(user_id, None)
+        key = self._user_broker_keys.pop(user_id, None)
+        if key is not None:
+            self._broker_account_cache.pop(key, None)
+    
+    async def update_user(self, user_id: str, update_data: Dict) -> Dict:
         """Update user data"""
-        return self._make_request("PATCH", f"/databases/{self.database_id}/collections/{self.users_collection_id}/documents/{user_id}", update_data)
+        result = await self._update_document(self._users_doc.format(user_id), update_data)
+        self._invalidate_user(user_id)
+        return result
     
-    def delete_user(self, user_id: str) -> Dict:
+    async def delete_user(self, user_id: str) -> Dict:
         """Delete a user"""
-        return self._make_request("DELETE", f"/databases/{self.database_id}/collections/{self.users_collection_id}/documents/{user_id}")
+        result = await self._make_request("DELETE", self._users_doc.format(user_id))
+        self._invalidate_user(user_id)
+        return result
     
     # ========== POSITION OPERATIONS ==========
     
-    def create_position(self, position_data: Dict) -> Dict:
+    async def create_position(self, position_data: Dict, position_id: str = "unique()") -> Dict:
         """Create a new trading position"""
-        return self._make_request("POST", f"/databases/{self.database_id}/collections/{self.positions_collection_id}/documents", position_data)
+        return await self._create_document(self._positions_docs, position_data, position_id)
+    
+    async def bulk_create_positions(self, positions: List[Dict]) -> List[Dict]:
+        """Create several trading positions at once"""
+        return await self._bulk_create(self._positions_docs, positions, self.create_position)
     
-    def get_positions(self, user_id: str, status: str = None) -> List[Dict]:
+    async def get_positions(self, user_id: str, status: str = None) -> List[Dict]:
         """Get positions for a user"""
-        queries = [f"equal(\"user_id\", \"{user_id}\")"]
+        queries = [_EQ_USER(_quote(user_id))]
         
         if status:
-            queries.append(f"equal(\"status\", \"{status}\")")
+            queries.append(_EQ_STATUS(_quote(status)))
         
-        result = self._make_request("GET", f"/databases/{self.database_id}/collections/{self.positions_collection_id}/documents", params={
+        result = await self._make_request("GET", self._positions_docs, params={
             "queries": queries,
             "orderField": "opened_at",
             "orderType": "DESC"
@@ -273,35 +548,43 @@ class AppwriteClient:
         
         return result.get("documents", [])
     
-    def get_position_by_id(self, position_id: str) -> Optional[Dict]:
+    async def get_position_by_id(self, position_id: str) -> Optional[Dict]:
         """Get position by ID"""
         try:
-            return self._make_request("GET", f"/databases/{self.database_id}/collections/{self.positions_collection_id}/documents/{position_id}")
+            position = await self._make_request("GET", self._positions_doc.format(position_id))
         except:
             return None
+        
+        if "error" in position:
+            return None
+        return position
     
-    def update_position(self, position_id: str, update_data: Dict) -> Dict:
+    async def update_position(self, position_id: str, update_data: Dict) -> Dict:
         """Update position data"""
-        return self._make_request("PATCH", f"/databases/{self.database_id}/collections/{self.positions_collection_id}/documents/{position_id}", update_data)
+        return await self._update_document(self._positions_doc.format(position_id), update_data)
     
-    def delete_position(self, position_id: str) -> Dict:
+    async def delete_position(self, position_id: str) -> Dict:
         """Delete a position"""
-        return self._make_request("DELETE", f"/databases/{self.database_id}/collections/{self.positions_collection_id}/documents/{position_id}")
+        return await self._make_request("DELETE", self._positions_doc.format(position_id))
     
     # ========== ORDER OPERATIONS ==========
     
-    def create_order(self, order_data: Dict) -> Dict:
+    async def create_order(self, order_data: Dict) -> Dict:
         """Create a new order"""
-        return self._make_request("POST", f"/databases/{self.database_id}/collections/{self.orders_collection_id}/documents", order_data)
+        return await self._create_document(self._orders_docs, order_data)
     
-    def get_orders(self, user_id: str, status: str = None) -> List[Dict]:
+    async def bulk_create_orders(self, orders: List[Dict]) -> List[Dict]:
+        """Create several orders at once"""
+        return await self._bulk_create(self._orders_docs, orders, self.create_order)
+    
+    async def get_orders(self, user_id: str, status: str = None) -> List[Dict]:
         """Get orders for a user"""
-        queries = [f"equal(\"user_id\", \"{user_id}\")"]
+        queries = [_EQ_USER(_quote(user_id))]
         
         if status:
-            queries.append(f"equal(\"status\", \"{status}\")")
+            queries.append(_EQ_STATUS(_quote(status)))
         
-        result = self._make_request("GET", f"/databases/{self.database_id}/collections/{self.orders_collection_id}/documents", params={
+        result = await self._make_request("GET", self._orders_docs, params={
             "queries": queries,
             "orderField": "created_at",
             "orderType": "DESC"
@@ -309,64 +592,82 @@ class AppwriteClient:
         
         return result.get("documents", [])
     
-    def update_order(self, order_id: str, update_data: Dict) -> Dict:
+    async def update_order(self, order_id: str, update_data: Dict) -> Dict:
         """Update order data"""
-        return self._make_request("PATCH", f"/databases/{self.database_id}/collections/{self.orders_collection_id}/documents/{order_id}", update_data)
+        return await self._update_document(self._orders_doc.format(order_id), update_data)
     
-    def delete_order(self, order_id: str) -> Dict:
+    async def delete_order(self, order_id: str) -> Dict:
         """Delete an order"""
-        return self._make_request("DELETE", f"/databases/{self.database_id}/collections/{self.orders_collection_id}/documents/{order_id}")
+        return await self._make_request("DELETE", self._orders_doc.format(order_id))
     
     # ========== NEWS OPERATIONS ==========
     
-    def create_news(self, news_data: Dict) -> Dict:
+    async def create_news(self, news_data: Dict) -> Dict:
         """Create news article"""
-        return self._make_request("POST", f"/databases/{self.database_id}/collections/{self.news_collection_id}/documents", news_data)
+        result = await self._create_document(self._news_docs, news_data)
+        self._news_cache.clear()
+        return result
+    
+    async def bulk_create_news(self, news_items: List[Dict]) -> List[Dict]:
+        """Create several news articles at once"""
+        result = await self._bulk_create(self._news_docs, news_items, self.create_news)
+        self._news_cache.clear()
+        return result
     
-    def get_news(self, category: str = None, limit: int = 10) -> List[Dict]:
+    async def get_news(self, category: str = None, limit: int = 10) -> List[Dict]:
         """Get news articles"""
-        queries = []
+        key = (category, limit)
+        if key in self._news_cache:
+            return self._news_cache[key]
+        
+        queries = [_LIMIT(limit)]
         
         if category:
-            queries.append(f"equal(\"category\", \"{category}\")")
+            queries.append(_equal("category", category))
         
-        result = self._make_request("GET", f"/databases/{self.database_id}/collections/{self.news_collection_id}/documents", params={
+        result = await self._make_request("GET", self._news_docs, params={
             "queries": queries,
             "orderField": "published_at",
-            "orderType": "DESC",
-            "limit": limit
+            "orderType": "DESC"
         })
         
-        return result.get("documents", [])
+        if "error" in result:
+            return []
+        
+        news = result.get("documents", [])
+        self._news_cache[key] = news
+        return news
     
-    def get_news_by_id(self, news_id: str) -> Optional[Dict]:
+    async def get_news_by_id(self, news_id: str) -> Optional[Dict]:
         """Get news by ID"""
         try:
-            return self._make_request("GET", f"/databases/{self.database_id}/collections/{self.news_collection_id}/documents/{news_id}")
+            return await self._make_request("GET", self._news_doc.format(news_id))
         except:
             return None
     
     # ========== UTILITY METHODS ==========
     
-    def list_databases(self) -> List[Dict]:
+    async def list_databases(self) -> List[Dict]:
         """List all databases"""
-        result = self._make_request("GET", "/databases")
+        result = await self._make_request("GET", "/databases")
         return result.get("databases", [])
     
-    def list_collections(self) -> List[Dict]:
+    async def list_collections(self) -> List[Dict]:
         """List all collections in current database"""
-        result = self._make_request("GET", f"/databases/{self.database_id}/collections")
+        result = await self._make_request("GET", self._collections)
         return result.get("collections", [])
     
-    def health_check(self) -> bool:
+    async def health_check(self) -> bool:
         """Check if Appwrite is reachable"""
         try:
-            result = self._make_request("GET", "/health")
+            result = await self._make_request("GET", "/health")
             return "status" in result and result["status"] == "ok"
         except:
             return False
 
-# Global Appwrite client instance
-appwrite_client = AppwriteClient()
+@lru_cache(maxsize=1)
+def get_client() -> AppwriteClient:
+    """Shared Appwrite client, created on first use"""
+    return AppwriteClient()
 
-print("✅ Appwrite client ready")
\ No newline at end of file
+log.debug("✅ Appwrite client ready")
\ No newline at end of file
@@ -2,12 +2,17 @@
 # FILENAME: backend/encryption.py
 # ============================================
 
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.backends import default_backend
 from cryptography.hazmat.primitives import hashes
-from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2
+from cryptography.hazmat.primitives.kdf.pbkdf2 import PBKDF2HMAC
+from pathlib import Path
+from typing import Optional
 import os
 import base64
+import hashlib
+import hmac
+import secrets
 
 # Get encryption key from environment
 ENCRYPTION_KEY_RAW = os.getenv("ENCRYPTION_KEY", "kanairy-secret-key-32-characters-long!")
@@ -16,63 +21,88 @@ ENCRYPTION_KEY_RAW = os.getenv("ENCRYPTION_KEY", "kanairy-secret-key-32-characte
 if len(ENCRYPTION_KEY_RAW) < 32:
     ENCRYPTION_KEY_RAW = ENCRYPTION_KEY_RAW.ljust(32, "0")[:32]
 
-# Derive a proper 32-byte key using PBKDF2
-def get_encryption_key():
-    kdf = PBKDF2(
+KEY_SALT = b'kanairy_salt_2024'  # Static salt for key derivation
+
+# The derived key is cached here so PBKDF2 doesn't rerun on every process start
+KEY_CACHE_DIR = Path.home() / ".cache" / "kanairy"
+KEY_CACHE_FILE = KEY_CACHE_DIR / "derived.key"  # verifier || key, owner-only
+
+def _derive_key() -> bytes:
+    kdf = PBKDF2HMAC(
         algorithm=hashes.SHA256(),
         length=32,
-        salt=b'kanairy_salt_2024',  # Static salt for key derivation
+        salt=KEY_SALT,
         iterations=100000,
         backend=default_backend()
     )
     return kdf.derive(ENCRYPTION_KEY_RAW.encode())
 
+def _cache_verifier() -> bytes:
+    """Tag the cached key with the secret it came from; stored only inside the owner-only cache file"""
+    return hmac.new(ENCRYPTION_KEY_RAW.encode(), KEY_SALT + b"kanairy-key-cache", hashlib.sha256).digest()
+
+# Derive a proper 32-byte key using PBKDF2
+def get_encryption_key():
+    cache_path = KEY_CACHE_FILE
+    verifier = _cache_verifier()
+    
+    try:
+        cached = cache_path.read_bytes()
+        if len(cached) == 64 and hmac.compare_digest(cached[:32], verifier):
+            return cached[32:]
+    except OSError:
+        pass
+    
+    key = _derive_key()
+    
+    # Write atomically with owner-only permissions; caching is best effort
+    try:
+        KEY_CACHE_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(verifier + key)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"⚠️ Could not cache encryption key: {e}")
+    
+    return key
+
 ENCRYPTION_KEY = get_encryption_key()
 
+# One-shot AEAD object, reused for every call
+AEAD = AESGCM(ENCRYPTION_KEY)
+
+NONCE_SIZE = 12  # NIST-recommended GCM nonce length
+
+_rand = secrets.token_bytes
+
 def encrypt_password(password: str) -> dict:
     """Encrypt password using AES-256-GCM"""
     try:
-        # Generate random IV (initialization vector)
-        iv = os.urandom(16)
-        
-        # Create cipher
-        cipher = Cipher(
-            algorithms.AES(ENCRYPTION_KEY),
-            modes.GCM(iv),
-            backend=default_backend()
-        )
-        encryptor = cipher.encryptor()
-        
-        # Encrypt
-        ciphertext = encryptor.update(password.encode()) + encryptor.finalize()
-        
-        return {
-            'encrypted': base64.b64encode(ciphertext).decode('utf-8'),
-            'iv': base64.b64encode(iv).decode('utf-8'),
-            'auth_tag': base64.b64encode(encryptor.tag).decode('utf-8')
-        }
+        # Random IV; AESGCM appends the auth tag, so the blob is iv || ciphertext || tag
+        iv = _rand(NONCE_SIZE)
+        return {'blob': base64.b64encode(iv + AEAD.encrypt(iv, password.encode(), None)).decode()}
     except Exception as e:
         print(f"❌ Encryption error: {e}")
         raise
 
-def decrypt_password(encrypted: str, iv: str, auth_tag: str) -> str:
-    """Decrypt password using AES-256-GCM"""
+def decrypt_password(blob: str, iv: Optional[str] = None, auth_tag: Optional[str] = None) -> str:
+    """Decrypt password using AES-256-GCM
+    
+    Records stored before the single-blob format keep the ciphertext, IV and
+    tag in separate fields; pass iv and auth_tag to decrypt those.
+    """
     try:
-        # Decode from base64
-        ciphertext = base64.b64decode(encrypted)
-        iv_bytes = base64.b64decode(iv)
-        tag = base64.b64decode(auth_tag)
-        
-        # Create cipher
-        cipher = Cipher(
-            algorithms.AES(ENCRYPTION_KEY),
-            modes.GCM(iv_bytes, tag),
-            backend=default_backend()
-        )
-        decryptor = cipher.decryptor()
+        if iv and auth_tag:
+            iv_bytes = base64.b64decode(iv)
+            ciphertext = base64.b64decode(blob) + base64.b64decode(auth_tag)
+        else:
+            raw = base64.b64decode(blob)
+            iv_bytes, ciphertext = raw[:NONCE_SIZE], raw[NONCE_SIZE:]
         
-        # Decrypt
-        plaintext = decryptor.update(ciphertext) + decryptor.finalize()
+        plaintext = AEAD.decrypt(iv_bytes, ciphertext, None)
         
         return plaintext.decode('utf-8')
     except Exception as e:
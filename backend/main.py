@@ -2,18 +2,28 @@
 # FILENAME: backend/main.py
 # ============================================
 
-from fastapi import FastAPI, HTTPException, Depends, Body, Query, status
+from fastapi import FastAPI, HTTPException, Depends, Body, Query, BackgroundTasks, Request, status
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
-from fastapi.security import HTTPBearer
-from typing import List, Optional
+from typing import List, Optional, Dict, Tuple, Callable, Awaitable, Any
+from pydantic import ValidationError
 import os
-from datetime import datetime
+import uuid
+from pathlib import Path
+from datetime import datetime, timezone
 import asyncio
+import concurrent.futures
 import json
+import logging
+import logging.handlers
+import queue
 
-from appwrite_client import appwrite_client
+from cachetools import TTLCache
+
+from appwrite_client import get_client, DATABASE_ID, PROJECT_ID, ENDPOINT
 from encryption import encrypt_password, decrypt_password
 from models import (
     BrokerConnect, TradeRequest, ClosePositionRequest,
@@ -21,59 +31,115 @@ from models import (
     AccountInfoResponse, ErrorResponse
 )
 
+# Settings read once at import (.env is loaded by appwrite_client)
+PORT = int(os.getenv("PORT", 8000))
+ENCRYPTION_KEY_LEN = len(os.getenv("ENCRYPTION_KEY", ""))
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Send kanairy.* logs through a queue so stream writes happen off the event loop
+    
+    Safe to call more than once: an existing queue handler's listener is reused.
+    """
+    logger = logging.getLogger("kanairy")
+    for handler in logger.handlers:
+        if isinstance(handler, logging.handlers.QueueHandler) and getattr(handler, "listener", None):
+            return handler.listener
+    
+    log_queue = queue.Queue(-1)
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    
+    logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    logger.addHandler(queue_handler)
+    logger.propagate = False
+    
+    listener = queue_handler.listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    return listener
+
+log_listener = setup_logging()
+logger = logging.getLogger("kanairy")
+
 # Initialize FastAPI app
 app = FastAPI(
     title="KanAIRY Trading API",
     version="2.0.0",
     description="Advanced MT5 Trading Platform with Appwrite Backend",
     docs_url="/api/docs",
-    redoc_url="/api/redoc"
+    redoc_url="/api/redoc",
+    default_response_class=ORJSONResponse
 )
 
-# Add CORS middleware
+# Add CORS middleware - explicit origins (comma-separated FRONTEND_ORIGIN) let browsers cache preflights
+FRONTEND_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv("FRONTEND_ORIGIN", f"http://localhost:{PORT}").split(",")
+    if origin.strip()
+]
+if "FRONTEND_ORIGIN" not in os.environ:
+    logger.warning("⚠️  FRONTEND_ORIGIN not set - CORS allows only %s", FRONTEND_ORIGINS[0])
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"],  # In production, replace with specific origins
+    allow_origins=FRONTEND_ORIGINS,
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST"],
+    allow_headers=["authorization", "content-type"],
+    max_age=86400,
 )
 
+# Compress JSON lists and the HTML page for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=1000, compresslevel=5)
+
 # Mount static files
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Security
-security = HTTPBearer()
+# In-flight work keyed by (operation, user_id) - concurrent callers await the same task
+_inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+
+async def single_flight(key: Tuple[str, str], factory: Callable[[], Awaitable[Any]]) -> Any:
+    """Run factory() once for all concurrent callers sharing key"""
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(factory())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _inflight.pop(key) if _inflight.get(key) is done else None)
+    return await asyncio.shield(task)
+
+# Recent MetaAPI account info per user - absorbs dashboard polling; dropped on trade/close
+ACCOUNT_CACHE_TTL = 3
+_account_cache: TTLCache = TTLCache(maxsize=10_000, ttl=ACCOUNT_CACHE_TTL)
+_account_generation: Dict[str, int] = {}  # user_id -> bumped on every invalidation
+
+def invalidate_account(user_id: str) -> None:
+    """Drop a user's cached account info and detach any refresh in flight, so it can't re-cache a stale balance"""
+    _account_cache.pop(user_id, None)
+    _account_generation[user_id] = _account_generation.get(user_id, 0) + 1
+    _inflight.pop(("account", user_id), None)
+
+# Cap on concurrent Appwrite writes when syncing positions from MetaAPI
+_sync_limit = asyncio.Semaphore(10)
 
 # Initialize MetaAPI
 metaapi_token = os.getenv("METAAPI_TOKEN")
 if not metaapi_token:
-    print("⚠️  WARNING: METAAPI_TOKEN not set!")
+    logger.warning("⚠️  METAAPI_TOKEN not set!")
     metaapi_client = None
 else:
-    print(f"🔑 MetaAPI token loaded")
+    logger.info("🔑 MetaAPI token loaded")
     from metaapi_client import MetaAPIClient
     metaapi_client = MetaAPIClient(metaapi_token)
 
-print("\n" + "="*60)
-print("🚀 KANAIRY TRADING API v2.0 - Appwrite Backend")
-print("="*60)
-print(f"📦 Appwrite Project: {os.getenv('APPWRITE_PROJECT_ID', '')[:20]}...")
-print(f"🔗 Database: {appwrite_client.database_id}")
-print(f"🌐 Endpoint: {os.getenv('APPWRITE_ENDPOINT')}")
-print("✅ API initialized successfully")
-print("="*60 + "\n")
+logger.info("🚀 KANAIRY TRADING API v2.0 - Appwrite Backend initialized")
+if logger.isEnabledFor(logging.DEBUG):
+    logger.debug(
+        "📦 Appwrite Project: %s... 🔗 Database: %s 🌐 Endpoint: %s",
+        PROJECT_ID[:20], DATABASE_ID, ENDPOINT
+    )
 
 # ========== HEALTH & STATUS ENDPOINTS ==========
 
-@app.get("/", response_class=HTMLResponse)
-async def serve_frontend():
-    """Serve the frontend application"""
-    try:
-        with open("static/index.html", "r") as f:
-            return HTMLResponse(content=f.read(), status_code=200)
-    except FileNotFoundError:
-        return HTMLResponse(content="""
+FALLBACK_HTML = """
         <html>
             <head><title>KanAIRY Trading Platform</title></head>
             <body style="background: #000; color: #fff; font-family: Arial; text-align: center; padding: 50px;">
@@ -83,33 +149,52 @@ async def serve_frontend():
                 <p>👨‍💻 Created by Thakgalo Matlala</p>
             </body>
         </html>
-        """)
+        """
+
+def load_frontend() -> bytes:
+    """Read the frontend page once at startup; fall back to a status page if it's missing"""
+    try:
+        return Path("static/index.html").read_bytes()
+    except FileNotFoundError:
+        return FALLBACK_HTML.encode()
+
+INDEX_HTML = load_frontend()
+
+@app.get("/", response_class=HTMLResponse)
+async def serve_frontend():
+    """Serve the frontend application"""
+    return HTMLResponse(content=INDEX_HTML)
 
 @app.get("/api/health")
 async def health_check():
     """Health check endpoint"""
-    appwrite_health = appwrite_client.health_check()
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
+    appwrite_health = await get_client().health_check()
     
     return {
         "status": "healthy",
-        "timestamp": datetime.utcnow().isoformat(),
+        "timestamp": now_iso,
         "service": "KanAIRY Trading API",
         "version": "2.0.0",
         "appwrite": "connected" if appwrite_health else "disconnected",
         "metaapi": "configured" if metaapi_token else "not_configured",
-        "database": appwrite_client.database_id
+        "database": DATABASE_ID
     }
 
 @app.get("/api/status")
 async def system_status():
     """Detailed system status"""
-    databases = appwrite_client.list_databases()
-    collections = appwrite_client.list_collections()
+    client = get_client()
+    databases, collections, connected = await asyncio.gather(
+        client.list_databases(),
+        client.list_collections(),
+        client.health_check()
+    )
     
     return {
         "appwrite": {
-            "connected": appwrite_client.health_check(),
-            "project_id": os.getenv("APPWRITE_PROJECT_ID", "")[:20] + "...",
+            "connected": connected,
+            "project_id": PROJECT_ID[:20] + "...",
             "database_count": len(databases),
             "collection_count": len(collections)
         },
@@ -119,15 +204,16 @@ async def system_status():
         },
         "encryption": {
             "enabled": True,
-            "key_length": len(os.getenv("ENCRYPTION_KEY", ""))
+            "key_length": ENCRYPTION_KEY_LEN
         }
     }
 
 # ========== USER MANAGEMENT ENDPOINTS ==========
 
-@app.post("/api/users/connect", response_model=AccountInfoResponse)
-async def connect_broker(data: BrokerConnect):
+@app.post("/api/users/connect", response_model=None, responses={200: {"model": AccountInfoResponse}})
+async def connect_broker(data: BrokerConnect, background_tasks: BackgroundTasks):
     """Connect to a broker account via MetaAPI"""
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
     try:
         if not metaapi_client:
             raise HTTPException(
@@ -135,57 +221,50 @@ async def connect_broker(data: BrokerConnect):
                 detail="MetaAPI not configured. Set METAAPI_TOKEN environment variable."
             )
         
-        print(f"\n{'='*60}")
-        print(f"🔌 BROKER CONNECTION REQUEST")
-        print(f"{'='*60}")
-        print(f"Login: {data.login}")
-        print(f"Server: {data.server}")
-        print(f"Platform: {data.platform}")
+        logger.info("🔌 Broker connection request login=%s server=%s platform=%s", data.login, data.server, data.platform)
         
         # Check if user already exists
-        existing_user = appwrite_client.get_user_by_broker_account(data.login, data.server)
+        existing_user = await get_client().get_user_by_broker_account(data.login, data.server)
         
         if existing_user:
             user_id = existing_user["$id"]
-            print(f"👤 Existing user found (ID: {user_id})")
+            logger.debug("👤 Existing user found (ID: %s)", user_id)
             
-            # Decrypt password for MetaAPI
+            # Decrypt password for MetaAPI (in a worker thread so the loop keeps serving)
             try:
-                decrypted_password = decrypt_password(
+                decrypted_password = await asyncio.to_thread(
+                    decrypt_password,
                     existing_user["encrypted_password"],
-                    existing_user["iv"],
-                    existing_user["auth_tag"]
+                    existing_user.get("iv"),
+                    existing_user.get("auth_tag")
                 )
-                print(f"🔓 Password decrypted for existing user")
+                logger.debug("🔓 Password decrypted for existing user")
             except Exception as e:
-                print(f"⚠️ Could not decrypt stored password: {e}")
+                logger.warning("⚠️ Could not decrypt stored password: %s", e)
                 decrypted_password = data.password
         else:
-            # Encrypt password
-            encrypted = encrypt_password(data.password)
+            # Encrypt password in a worker thread
+            encrypted = await asyncio.to_thread(encrypt_password, data.password)
             
             # Create user in Appwrite
             user_data = {
                 "broker_account": data.login,
-                "encrypted_password": encrypted['encrypted'],
-                "iv": encrypted['iv'],
-                "auth_tag": encrypted['auth_tag'],
+                "encrypted_password": encrypted['blob'],
                 "server": data.server,
                 "broker": data.broker,
                 "account_type": data.account_type,
                 "balance": 0.0,
                 "equity": 0.0,
                 "currency": "USD",
-                "last_login": datetime.utcnow().isoformat()
+                "last_login": now_iso
             }
             
-            result = appwrite_client.create_user(user_data)
+            result = await get_client().create_user(user_data)
             user_id = result["$id"]
-            print(f"✨ New user created (ID: {user_id})")
+            logger.info("✨ New user created (ID: %s)", user_id)
             decrypted_password = data.password
         
         # Connect to MetaAPI
-        print(f"🔗 Connecting to MetaAPI...")
         account_info = await metaapi_client.connect_account(
             login=data.login,
             password=decrypted_password,
@@ -193,32 +272,22 @@ async def connect_broker(data: BrokerConnect):
             platform=data.platform
         )
         
-        # Update user balance
-        appwrite_client.update_user(user_id, {
-            "balance": account_info['balance'],
-            "equity": account_info['equity'],
-            "last_login": datetime.utcnow().isoformat()
+        # Update user balance once the response has been sent
+        background_tasks.add_task(get_client().update_user, user_id, {
+            "balance": account_info.balance,
+            "equity": account_info.equity,
+            "last_login": now_iso
         })
         
-        print(f"\n✅ CONNECTION SUCCESSFUL!")
-        print(f"Balance: ${account_info['balance']:.2f}")
-        print(f"Equity: ${account_info['equity']:.2f}")
-        print(f"Currency: {account_info['currency']}")
-        print(f"{'='*60}\n")
-        
-        return AccountInfoResponse(
-            user_id=user_id,
-            broker_account=data.login,
-            server=data.server,
-            balance=account_info['balance'],
-            equity=account_info['equity'],
-            margin=account_info.get('margin', 0),
-            free_margin=account_info.get('freeMargin', 0),
-            currency=account_info['currency']
+        logger.info(
+            "✅ Connected login=%s balance=%.2f equity=%.2f currency=%s",
+            data.login, account_info.balance, account_info.equity, account_info.currency
         )
         
+        return account_response(user_id, data.login, data.server, account_info)
+        
     except Exception as e:
-        print(f"\n❌ CONNECTION FAILED: {str(e)}\n")
+        logger.error("❌ Connection failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Connection failed: {str(e)}"
@@ -227,7 +296,7 @@ async def connect_broker(data: BrokerConnect):
 @app.get("/api/users/{user_id}", response_model=UserResponse)
 async def get_user(user_id: str):
     """Get user information"""
-    user = appwrite_client.get_user_by_id(user_id)
+    user = await get_client().get_user_by_id(user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -243,14 +312,18 @@ async def get_user(user_id: str):
         balance=user["balance"],
         equity=user["equity"],
         currency=user["currency"],
-        last_login=datetime.fromisoformat(user["last_login"]) if user.get("last_login") else None
+        last_login=user.get("last_login") or None
     )
 
-@app.get("/api/users/{user_id}/account", response_model=AccountInfoResponse)
-async def get_account_info(user_id: str):
+@app.get("/api/users/{user_id}/account", response_model=None, responses={200: {"model": AccountInfoResponse}})
+async def get_account_info(user_id: str, background_tasks: BackgroundTasks):
     """Get account information from MetaAPI"""
+    cached = _account_cache.get(user_id)
+    if cached is not None:
+        return cached
+    
     try:
-        user = appwrite_client.get_user_by_id(user_id)
+        user = await get_client().get_user_by_id(user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -263,39 +336,8 @@ async def get_account_info(user_id: str):
                 detail="MetaAPI not configured"
             )
         
-        # Get fresh data from MetaAPI
-        try:
-            account_info = await metaapi_client.get_account_info(user["broker_account"])
-            
-            # Update database
-            appwrite_client.update_user(user_id, {
-                "balance": account_info['balance'],
-                "equity": account_info['equity']
-            })
-            
-            return AccountInfoResponse(
-                user_id=user_id,
-                broker_account=user["broker_account"],
-                server=user["server"],
-                balance=account_info['balance'],
-                equity=account_info['equity'],
-                margin=account_info.get('margin', 0),
-                free_margin=account_info.get('freeMargin', 0),
-                currency=account_info['currency']
-            )
-        except Exception as metaapi_error:
-            # If MetaAPI fails, return cached data
-            print(f"⚠️ MetaAPI error, using cached data: {metaapi_error}")
-            return AccountInfoResponse(
-                user_id=user_id,
-                broker_account=user["broker_account"],
-                server=user["server"],
-                balance=user["balance"],
-                equity=user["equity"],
-                margin=0,
-                free_margin=0,
-                currency=user.get("currency", "USD")
-            )
+        # Concurrent polls for the same user share one MetaAPI fetch + DB write
+        return await single_flight(("account", user_id), lambda: refresh_account_info(user_id, user, background_tasks))
         
     except Exception as e:
         raise HTTPException(
@@ -303,11 +345,75 @@ async def get_account_info(user_id: str):
             detail=str(e)
         )
 
+def account_response(user_id: str, broker_account: str, server: str, info) -> AccountInfoResponse:
+    """Wrap a MetaAPI AccountInfoDTO for the API - trusted data, so validation is skipped
+    
+    The account routes declare the model for the docs only (response_model=None),
+    so FastAPI serializes the result without validating it a second time.
+    """
+    return AccountInfoResponse.model_construct(
+        user_id=user_id,
+        broker_account=broker_account,
+        server=server,
+        balance=info.balance,
+        equity=info.equity,
+        margin=info.margin,
+        free_margin=info.free_margin,
+        currency=info.currency
+    )
+
+async def refresh_account_info(user_id: str, user: Dict, background_tasks: BackgroundTasks) -> AccountInfoResponse:
+    """Fetch fresh account data from MetaAPI and store the balance"""
+    generation = _account_generation.get(user_id, 0)
+    try:
+        account_info = await metaapi_client.get_account_info(user["broker_account"])
+        response = account_response(user_id, user["broker_account"], user["server"], account_info)
+        
+        # A trade or close landed while this was in flight - serve it, but don't cache or store it
+        if _account_generation.get(user_id, 0) != generation:
+            return response
+        
+        # Update database after the response is sent
+        background_tasks.add_task(get_client().update_user, user_id, {
+            "balance": account_info.balance,
+            "equity": account_info.equity
+        })
+        
+        _account_cache[user_id] = response
+        return response
+    except Exception as metaapi_error:
+        # If MetaAPI fails, return cached data
+        logger.warning("⚠️ MetaAPI error, using cached data: %s", metaapi_error)
+        return AccountInfoResponse(
+            user_id=user_id,
+            broker_account=user["broker_account"],
+            server=user["server"],
+            balance=user["balance"],
+            equity=user["equity"],
+            margin=0,
+            free_margin=0,
+            currency=user.get("currency", "USD")
+        )
+
 # ========== TRADING ENDPOINTS ==========
 
-@app.post("/api/trade")
-async def place_trade(trade: TradeRequest):
+# FastAPI would json.loads the body and then validate the dict; model_validate_json does both in one
+# pydantic-core pass. The body schema is declared by hand since the route no longer takes the model.
+@app.post("/api/trade", openapi_extra={
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": TradeRequest.model_json_schema()}}
+    }
+})
+async def place_trade(request: Request, background_tasks: BackgroundTasks):
     """Place a new trade"""
+    try:
+        trade = TradeRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Same 422 shape FastAPI produces for body models
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+    
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
     try:
         if not metaapi_client:
             raise HTTPException(
@@ -315,16 +421,10 @@ async def place_trade(trade: TradeRequest):
                 detail="MetaAPI not configured"
             )
         
-        print(f"\n{'='*60}")
-        print(f"📊 TRADE REQUEST")
-        print(f"{'='*60}")
-        print(f"User ID: {trade.user_id}")
-        print(f"Symbol: {trade.symbol}")
-        print(f"Type: {trade.type}")
-        print(f"Volume: {trade.volume}")
+        logger.info("📊 Trade %s %s vol=%s user=%s", trade.symbol, trade.type, trade.volume, trade.user_id)
         
         # Get user
-        user = appwrite_client.get_user_by_id(trade.user_id)
+        user = await get_client().get_user_by_id(trade.user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -341,11 +441,11 @@ async def place_trade(trade: TradeRequest):
             take_profit=trade.take_profit
         )
         
-        print(f"✅ Trade executed successfully")
-        print(f"Order ID: {result.get('orderId')}")
-        print(f"{'='*60}\n")
+        logger.info("✅ Trade executed order=%s", result.get('orderId'))
+        invalidate_account(trade.user_id)
         
-        # Save position to Appwrite
+        # Save position to Appwrite after responding - the ID is chosen here so it can be returned now
+        position_id = uuid.uuid4().hex
         position_data = {
             "user_id": trade.user_id,
             "symbol": trade.symbol,
@@ -358,14 +458,14 @@ async def place_trade(trade: TradeRequest):
             "profit": 0.0,
             "status": "open",
             "broker_position_id": str(result.get('positionId', result.get('orderId', ''))),
-            "opened_at": datetime.utcnow().isoformat()
+            "opened_at": now_iso
         }
         
-        position_result = appwrite_client.create_position(position_data)
+        background_tasks.add_task(save_position, position_id, position_data, result.get('orderId'))
         
         return {
             "success": True,
-            "position_id": position_result["$id"],
+            "position_id": position_id,
             "broker_order_id": result.get('orderId'),
             "broker_position_id": result.get('positionId'),
             "symbol": trade.symbol,
@@ -375,52 +475,65 @@ async def place_trade(trade: TradeRequest):
         }
         
     except Exception as e:
-        print(f"❌ Trade failed: {str(e)}")
-        print(f"{'='*60}\n")
+        logger.error("❌ Trade failed: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
         )
 
+async def save_position(position_id: str, position_data: Dict, broker_order_id: Optional[str]) -> None:
+    """Store a placed trade's position; on failure log the IDs needed to reconcile it with the broker"""
+    result = await get_client().create_position(position_data, position_id)
+    if "error" in result:
+        logger.error(
+            "❌ Position %s not saved (broker order=%s position=%s): %s",
+            position_id, broker_order_id, position_data["broker_position_id"], result["error"]
+        )
+
 @app.get("/api/users/{user_id}/positions", response_model=List[PositionResponse])
 async def get_positions(user_id: str, status: str = "open"):
     """Get positions for a user"""
     try:
-        positions = appwrite_client.get_positions(user_id, status)
-        
-        # If MetaAPI is available, try to sync positions
+        # If MetaAPI is available, try to sync positions - the user is fetched alongside them
         if metaapi_client and status == "open":
+            positions, user = await asyncio.gather(
+                get_client().get_positions(user_id, status),
+                get_client().get_user_by_id(user_id)
+            )
+        else:
+            positions, user = await get_client().get_positions(user_id, status), None
+        
+        if user:
             try:
-                user = appwrite_client.get_user_by_id(user_id)
-                if user:
-                    # Get fresh positions from MetaAPI
-                    metaapi_positions = await metaapi_client.get_positions(user["broker_account"])
-                    
-                    # Update positions in database (simplified sync)
-                    for meta_pos in metaapi_positions:
-                        # Find matching position and update
-                        pass
+                # Fetch from MetaAPI and write changes once for all concurrent requests for this user
+                patches = await single_flight(
+                    ("positions", user_id),
+                    lambda: sync_positions(user["broker_account"], positions)
+                )
+                for pos in positions:
+                    pos.update(patches.get(pos["$id"], ()))
             except Exception as sync_error:
-                print(f"⚠️ Could not sync with MetaAPI: {sync_error}")
-        
-        return [
-            PositionResponse(
-                id=pos["$id"],
-                user_id=pos["user_id"],
-                symbol=pos["symbol"],
-                type=pos["type"],
-                volume=pos["volume"],
-                open_price=pos["open_price"],
-                current_price=pos["current_price"],
-                profit=pos["profit"],
-                stop_loss=pos.get("stop_loss"),
-                take_profit=pos.get("take_profit"),
-                status=pos["status"],
-                opened_at=datetime.fromisoformat(pos["opened_at"]),
-                closed_at=datetime.fromisoformat(pos["closed_at"]) if pos.get("closed_at") else None
-            )
+                logger.warning("⚠️ Could not sync with MetaAPI: %s", sync_error)
+        
+        # Appwrite rows are trusted - project them straight to JSON (timestamps stay ISO strings)
+        return ORJSONResponse([
+            {
+                "id": pos["$id"],
+                "user_id": pos["user_id"],
+                "symbol": pos["symbol"],
+                "type": pos["type"],
+                "volume": pos["volume"],
+                "open_price": pos["open_price"],
+                "current_price": pos["current_price"],
+                "profit": pos["profit"],
+                "stop_loss": pos.get("stop_loss"),
+                "take_profit": pos.get("take_profit"),
+                "status": pos["status"],
+                "opened_at": pos["opened_at"],
+                "closed_at": pos.get("closed_at")
+            }
             for pos in positions
-        ]
+        ])
         
     except Exception as e:
         raise HTTPException(
@@ -428,9 +541,39 @@ async def get_positions(user_id: str, status: str = "open"):
             detail=str(e)
         )
 
+async def sync_positions(broker_account: str, positions: List[Dict]) -> Dict[str, Dict]:
+    """Diff stored positions against MetaAPI and write only the changed fields"""
+    metaapi_positions = await metaapi_client.get_positions(broker_account)
+    db_by_broker_id = {pos["broker_position_id"]: pos for pos in positions if pos.get("broker_position_id")}
+    
+    patches = {}
+    for meta_pos in metaapi_positions:
+        pos = db_by_broker_id.get(str(meta_pos.get("id")))
+        if pos is None:
+            continue
+        patch = {
+            field: meta_pos[key]
+            for field, key in (("current_price", "currentPrice"), ("profit", "profit"))
+            if key in meta_pos and meta_pos[key] != pos.get(field)
+        }
+        if patch:
+            patches[pos["$id"]] = patch
+    
+    async def write(position_id: str, patch: Dict) -> None:
+        async with _sync_limit:
+            result = await get_client().update_position(position_id, patch)
+        if "error" in result:
+            logger.warning("⚠️ Could not sync position %s: %s", position_id, result["error"])
+    
+    await asyncio.gather(*(write(position_id, patch) for position_id, patch in patches.items()))
+    if patches:
+        logger.debug("🔄 Synced %d positions for %s", len(patches), broker_account)
+    return patches
+
 @app.post("/api/positions/close")
 async def close_position(request: ClosePositionRequest):
     """Close a position"""
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
     try:
         if not metaapi_client:
             raise HTTPException(
@@ -438,40 +581,43 @@ async def close_position(request: ClosePositionRequest):
                 detail="MetaAPI not configured"
             )
         
-        position = appwrite_client.get_position_by_id(request.position_id)
+        # Independent lookups - issued together so they share the HTTP/2 connection
+        position, user = await asyncio.gather(
+            get_client().get_position_by_id(request.position_id),
+            get_client().get_user_by_id(request.user_id)
+        )
         if not position:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Position not found"
             )
         
-        user = appwrite_client.get_user_by_id(request.user_id)
         if not user:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
         
-        print(f"\n🔒 Closing position {position['$id']} ({position['symbol']})")
+        logger.info("🔒 Closing position %s (%s)", position['$id'], position['symbol'])
         
         # Close via MetaAPI
         result = await metaapi_client.close_position(
             account_login=user["broker_account"],
             position_id=position["broker_position_id"]
         )
+        invalidate_account(request.user_id)
         
         # Update position in Appwrite
         update_data = {
             "current_price": result.get('closePrice', position["current_price"]),
             "profit": result.get('profit', 0) or result.get('pl', 0),
             "status": "closed",
-            "closed_at": datetime.utcnow().isoformat()
+            "closed_at": now_iso
         }
         
-        appwrite_client.update_position(request.position_id, update_data)
+        await get_client().update_position(request.position_id, update_data)
         
-        print(f"✅ Position closed successfully")
-        print(f"Profit: ${update_data['profit']:.2f}\n")
+        logger.info("✅ Position closed profit=%.2f", update_data['profit'])
         
         return {
             "success": True,
@@ -480,8 +626,10 @@ async def close_position(request: ClosePositionRequest):
             "profit": update_data['profit']
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
-        print(f"❌ Failed to close position: {str(e)}\n")
+        logger.error("❌ Failed to close position: %s", e)
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=str(e)
@@ -493,22 +641,22 @@ async def close_position(request: ClosePositionRequest):
 async def get_orders(user_id: str, status: str = "pending"):
     """Get orders for a user"""
     try:
-        orders = appwrite_client.get_orders(user_id, status)
-        
-        return [
-            OrderResponse(
-                id=order["$id"],
-                user_id=order["user_id"],
-                symbol=order["symbol"],
-                type=order["type"],
-                volume=order["volume"],
-                price=order["price"],
-                status=order["status"],
-                created_at=datetime.fromisoformat(order["created_at"]),
-                executed_at=datetime.fromisoformat(order["executed_at"]) if order.get("executed_at") else None
-            )
+        orders = await get_client().get_orders(user_id, status)
+        
+        return ORJSONResponse([
+            {
+                "id": order["$id"],
+                "user_id": order["user_id"],
+                "symbol": order["symbol"],
+                "type": order["type"],
+                "volume": order["volume"],
+                "price": order["price"],
+                "status": order["status"],
+                "created_at": order["created_at"],
+                "executed_at": order.get("executed_at")
+            }
             for order in orders
-        ]
+        ])
         
     except Exception as e:
         raise HTTPException(
@@ -521,8 +669,9 @@ async def get_orders(user_id: str, status: str = "pending"):
 @app.get("/api/news", response_model=List[NewsResponse])
 async def get_news(category: Optional[str] = None, limit: int = 10):
     """Get news articles"""
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
     try:
-        news_articles = appwrite_client.get_news(category, limit)
+        news_articles = await get_client().get_news(category, limit)
         
         # If no news in database, create sample news
         if not news_articles:
@@ -532,7 +681,7 @@ async def get_news(category: Optional[str] = None, limit: int = 10):
                     "content": "The KanAIRY trading platform is now officially live! Start your automated trading journey today.",
                     "source": "KanAIRY",
                     "category": "platform",
-                    "published_at": datetime.utcnow().isoformat(),
+                    "published_at": now_iso,
                     "image_url": "https://images.unsplash.com/photo-1611974789855-9c2a0a7236a3?w=800"
                 },
                 {
@@ -540,28 +689,30 @@ async def get_news(category: Optional[str] = None, limit: int = 10):
                     "content": "EUR/USD shows strong bullish momentum, breaking key resistance levels. Technical indicators suggest continued upward movement.",
                     "source": "Market Watch",
                     "category": "forex",
-                    "published_at": datetime.utcnow().isoformat(),
+                    "published_at": now_iso,
                     "image_url": "https://images.unsplash.com/photo-1611974789855-9c2a0a7236a3?w-800"
                 }
             ]
             
-            for news in sample_news:
-                appwrite_client.create_news(news)
-            
-            news_articles = appwrite_client.get_news(category, limit)
-        
-        return [
-            NewsResponse(
-                id=news["$id"],
-                title=news["title"],
-                content=news["content"],
-                source=news["source"],
-                category=news["category"],
-                published_at=datetime.fromisoformat(news["published_at"]),
-                image_url=news.get("image_url")
-            )
+            # Create in one bulk request and serve what was written - no second read
+            created = await get_client().bulk_create_news(sample_news)
+            news_articles = [
+                news for news in created
+                if "$id" in news and (category is None or news["category"] == category)
+            ][:limit]
+        
+        return ORJSONResponse([
+            {
+                "id": news["$id"],
+                "title": news["title"],
+                "content": news["content"],
+                "source": news["source"],
+                "category": news["category"],
+                "published_at": news["published_at"],
+                "image_url": news.get("image_url")
+            }
             for news in news_articles
-        ]
+        ])
         
     except Exception as e:
         raise HTTPException(
@@ -582,7 +733,7 @@ async def create_news_article(news: NewsResponse):
             "image_url": news.image_url
         }
         
-        result = appwrite_client.create_news(news_data)
+        result = await get_client().create_news(news_data)
         
         return {
             "success": True,
@@ -600,44 +751,80 @@ async def create_news_article(news: NewsResponse):
 
 @app.exception_handler(HTTPException)
 async def http_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=exc.status_code,
         content=ErrorResponse(
             error=exc.detail,
             details=str(exc) if str(exc) != exc.detail else None
-        ).dict()
+        ).model_dump()
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request, exc):
-    return JSONResponse(
+    return ORJSONResponse(
         status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
         content=ErrorResponse(
             error="Internal server error",
             details=str(exc)
-        ).dict()
+        ).model_dump()
     )
 
 # ========== STARTUP EVENT ==========
 
 @app.on_event("startup")
 async def startup_event():
-    print("\n✅ KanAIRY Trading API Started Successfully!")
-    print(f"📍 Access the app at: http://localhost:{os.getenv('PORT', 8000)}")
-    print(f"📚 API Documentation: http://localhost:{os.getenv('PORT', 8000)}/api/docs")
-    print(f"👨‍💻 Created by: Thakgalo Matlala")
-    print("="*60 + "\n")
+    logger.info("✅ KanAIRY Trading API started on port %s (docs at /api/docs)", PORT)
+    
+    # Bounded, named pool for to_thread work (crypto) and any blocking hops inside the MetaAPI SDK
+    asyncio.get_running_loop().set_default_executor(
+        concurrent.futures.ThreadPoolExecutor(max_workers=32, thread_name_prefix="metaapi")
+    )
     
-    # Create some sample data if needed
-    await create_sample_data()
+    # Initialize database and collections
+    await get_client().initialize_database()
+    
+    # Seed sample data in the background so startup isn't held up (SEED_SAMPLE_DATA=0 skips it)
+    if os.getenv("SEED_SAMPLE_DATA", "1") == "1":
+        spawn(create_sample_data())
+    
+    # Open MetaAPI connections for known users in the background and keep them alive
+    if metaapi_client:
+        spawn(prewarm_connections())
+        metaapi_client.start_keepalive()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    if metaapi_client:
+        await metaapi_client.close()
+    await get_client().aclose()
+    log_listener.stop()
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected mid-run
+_pending_tasks = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _pending_tasks.add(task)
+    task.add_done_callback(_pending_tasks.discard)
+    return task
+
+async def prewarm_connections():
+    """Connect already-deployed MetaAPI accounts so first requests skip the connect cost"""
+    try:
+        users = await get_client().list_users()
+        warmed = await metaapi_client.prewarm([(user["broker_account"], user["server"]) for user in users])
+        logger.info("🔥 Prewarmed %d MetaAPI connection(s)", warmed)
+    except Exception as e:
+        logger.warning("⚠️ Could not prewarm MetaAPI connections: %s", e)
 
 async def create_sample_data():
     """Create sample data for testing"""
+    now_iso = datetime.now(timezone.utc).isoformat(timespec="milliseconds")
     try:
         # Check if we have any news
-        news = appwrite_client.get_news(limit=1)
+        news = await get_client().get_news(limit=1)
         if not news:
-            print("📰 Creating sample news articles...")
+            logger.info("📰 Creating sample news articles...")
             
             sample_news = [
                 {
@@ -645,25 +832,36 @@ async def create_sample_data():
                     "content": "This is an advanced trading platform built by Thakgalo Matlala. Connect your MT5 account and start automated trading.",
                     "source": "KanAIRY",
                     "category": "announcement",
-                    "published_at": datetime.utcnow().isoformat()
+                    "published_at": now_iso
                 },
                 {
                     "title": "EUR/USD Technical Analysis",
                     "content": "The EUR/USD pair is showing strong bullish signals. Key resistance at 1.0900, support at 1.0800.",
                     "source": "Technical Analysis",
                     "category": "forex",
-                    "published_at": datetime.utcnow().isoformat()
+                    "published_at": now_iso
                 }
             ]
             
-            for news_item in sample_news:
-                appwrite_client.create_news(news_item)
+            await get_client().bulk_create_news(sample_news)
             
-            print("✅ Sample data created")
+            logger.info("✅ Sample data created")
     except Exception as e:
-        print(f"⚠️ Could not create sample data: {e}")
+        logger.warning("⚠️ Could not create sample data: %s", e)
 
 if __name__ == "__main__":
+    import sys
     import uvicorn
-    port = int(os.getenv("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # Let uvicorn's "main:app" import resolve to this module instead of executing it a second time
+    sys.modules.setdefault("main", sys.modules[__name__])
+    # MetaAPI connections and caches live in process memory - keep WEB_CONCURRENCY at 1 unless sessions are pinned
+    uvicorn.run(
+        "main:app",
+        host="0.0.0.0",
+        port=PORT,
+        workers=int(os.getenv("WEB_CONCURRENCY", 1)),
+        loop="uvloop",
+        http="httptools",
+        timeout_keep_alive=30,
+        access_log=False
+    )
\ No newline at end of file
@@ -3,16 +3,74 @@
 # ============================================
 
 import os
+import time
 import asyncio
-from typing import Optional, Dict, List
+import logging
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Tuple, Any
 from metaapi_cloud_sdk import MetaApi
 
+log = logging.getLogger("kanairy.metaapi")
+
+# How long a (login, server) -> MetaAPI account lookup is trusted; misses expire sooner
+ACCOUNT_INDEX_TTL = 300
+ACCOUNT_MISS_TTL = 30
+
+# Seconds between keepalive pings, and how long a request waits for a reconnect to finish
+KEEPALIVE_INTERVAL = 30
+READY_TIMEOUT = 60
+
+# Account info is reused for this many seconds unless a trade or close changes it
+INFO_CACHE_TTL = 0.25
+
+# Most closes in flight at once per close_positions call - brokers throttle bursts
+CLOSE_CONCURRENCY = 8
+
+class MetaAPIError(RuntimeError):
+    """Raised for MetaAPI failures; the SDK error, if any, is chained as __cause__"""
+    __slots__ = ()
+
+@dataclass(slots=True, frozen=True)
+class AccountInfoDTO:
+    """Balance snapshot of a trading account, shared read-only between callers"""
+    balance: float
+    equity: float
+    margin: float
+    free_margin: float
+    currency: str
+    
+    @classmethod
+    def from_metaapi(cls, account_info: Dict) -> "AccountInfoDTO":
+        """Build from a MetaAPI account information payload"""
+        return cls(
+            account_info['balance'],
+            account_info['equity'],
+            account_info.get('margin', 0),
+            account_info.get('freeMargin', 0),
+            account_info.get('currency', 'USD')
+        )
+
 class MetaAPIClient:
+    # Order type -> RPC connection method that places it (bound per account in _open_connection)
+    _ORDER_DISPATCH = {
+        "buy": "create_market_buy_order",
+        "sell": "create_market_sell_order"
+    }
+    
     def __init__(self, token: str):
         self.token = token
         self.api = MetaApi(token)
-        self.accounts = {}  # Cache accounts by login
-        print("🔌 MetaAPI client initialized")
+        self.accounts = {}  # Open connections by login, reused for the process lifetime
+        self._account_index: Dict[Tuple[str, str], Tuple[Any, float]] = {}  # (account or None, expiry)
+        self._accounts_future: Optional[asyncio.Future] = None  # In-flight account listing, shared by callers
+        self._ready: Dict[str, asyncio.Event] = {}  # Cleared while a login is reconnecting
+        self._failed: Dict[str, str] = {}  # login -> last reconnect error, until a reconnect succeeds
+        self._order_locks: Dict[str, asyncio.Lock] = {}  # One order/close in flight per login; survives reconnects
+        self._keepalive_task: Optional[asyncio.Task] = None
+        self._connecting: Dict[str, Tuple[str, asyncio.Task]] = {}  # login -> (server, open in flight)
+        self._info_cache: Dict[str, Tuple[float, AccountInfoDTO]] = {}  # login -> (fetched at, info)
+        self._info_generation: Dict[str, int] = {}  # login -> bumped on every invalidation
+        log.info("🔌 MetaAPI client initialized")
         
     async def connect_account(
         self, 
@@ -20,28 +78,25 @@ class MetaAPIClient:
         password: str, 
         server: str,
         platform: str = "mt5"
-    ) -> Dict:
+    ) -> AccountInfoDTO:
         """Connect to a trading account via MetaAPI"""
         try:
-            print(f"\n{'='*60}")
-            print(f"🔍 MetaAPI: Connecting account {login}")
-            print(f"{'='*60}")
+            log.info("🔍 MetaAPI: Connecting account %s", login)
             
-            # Check if account already exists in MetaAPI
-            existing_accounts = await self.api.metatrader_account_api.get_accounts()
-            existing_account = None
+            cached = self.accounts.get(login)
+            if cached and cached['server'] == server and login not in self._failed:
+                log.debug("♻️ Reusing open connection for %s", login)
+                return await self._account_summary((await self._ready_account(login))['connection'], login)
             
-            for acc in existing_accounts:
-                if acc.login == login and acc.server == server:
-                    existing_account = acc
-                    print(f"✅ Found existing MetaAPI account: {acc.id}")
-                    break
+            # Check if account already exists in MetaAPI
+            existing_account = await self._find_account(login, server)
             
             if existing_account:
                 account = existing_account
+                log.debug("✅ Found existing MetaAPI account: %s", account.id)
             else:
                 # Create new account in MetaAPI
-                print(f"🆕 Creating new MetaAPI account...")
+                log.info("🆕 Creating new MetaAPI account for %s", login)
                 account = await self.api.metatrader_account_api.create_account({
                     'name': f'KanAIRY_{login}',
                     'type': 'cloud',
@@ -53,77 +108,307 @@ class MetaAPIClient:
                     'magic': 123456,
                     'region': 'new-york'
                 })
-                print(f"✅ MetaAPI account created: {account.id}")
-            
-            # Deploy account
-            print(f"🚀 Deploying account...")
-            await account.deploy()
-            
-            # Wait for deployment
-            print(f"⏳ Waiting for deployment...")
-            await account.wait_deployed()
-            print(f"✅ Account deployed")
-            
-            # Connect
-            print(f"🔌 Connecting to broker...")
-            await account.wait_connected()
-            print(f"✅ Connected to broker")
-            
-            # Get RPC connection
-            connection = account.get_rpc_connection()
-            await connection.connect()
-            
-            print(f"⏳ Synchronizing account data...")
-            await connection.wait_synchronized()
-            print(f"✅ Account synchronized")
-            
-            # Get account information
-            account_info = await connection.get_account_information()
-            
-            # Cache account
-            self.accounts[login] = {
-                'account': account,
-                'connection': connection
-            }
-            
-            print(f"\n💰 Account Details:")
-            print(f"   Balance: ${account_info['balance']:.2f}")
-            print(f"   Equity: ${account_info['equity']:.2f}")
-            print(f"   Currency: {account_info.get('currency', 'USD')}")
-            print(f"{'='*60}\n")
-            
-            return {
-                'balance': account_info['balance'],
-                'equity': account_info['equity'],
-                'margin': account_info.get('margin', 0),
-                'freeMargin': account_info.get('freeMargin', 0),
-                'currency': account_info.get('currency', 'USD'),
-                'leverage': account_info.get('leverage', 100),
-                'name': account_info.get('name', login)
-            }
+                self._account_index[(login, server)] = (account, time.monotonic() + ACCOUNT_INDEX_TTL)
+                log.info("✅ MetaAPI account created: %s", account.id)
+            
+            connection = await self._open_connection(login, server, account)
+            return await self._account_summary(connection, login)
             
         except Exception as e:
-            print(f"\n❌ MetaAPI Error: {str(e)}\n")
-            raise Exception(f"MetaAPI connection failed: {str(e)}")
+            log.error("❌ MetaAPI Error: %s", e)
+            raise MetaAPIError(str(e)) from e
+    
+    async def connect_accounts(self, creds: List[Dict]) -> List:
+        """Connect several accounts concurrently
+        
+        Each item holds connect_account keyword arguments. Results keep input order;
+        a failed connect appears as its exception instead of aborting the batch.
+        Concurrent lookups share a single get_accounts() call.
+        """
+        async def connect(c: Dict) -> Dict:
+            return await self.connect_account(**c)
+        
+        return await asyncio.gather(*[connect(c) for c in creds], return_exceptions=True)
+    
+    async def _find_account(self, login: str, server: str):
+        """Look up a MetaAPI account by login and server, listing accounts only on a cache miss"""
+        key = (login, server)
+        entry = self._account_index.get(key)
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        
+        await self._refresh_account_index()
+        if key not in self._account_index:
+            self._account_index[key] = (None, time.monotonic() + ACCOUNT_MISS_TTL)
+        return self._account_index[key][0]
+    
+    async def _refresh_account_index(self) -> None:
+        """Re-index MetaAPI accounts; concurrent callers await the same get_accounts() call"""
+        if self._accounts_future is None:
+            self._accounts_future = asyncio.ensure_future(self._list_accounts())
+            self._accounts_future.add_done_callback(lambda _: setattr(self, '_accounts_future', None))
+        await asyncio.shield(self._accounts_future)
+    
+    async def _list_accounts(self) -> None:
+        """List every MetaAPI account once and index it by (login, server)"""
+        existing_accounts = await self.api.metatrader_account_api.get_accounts()
+        expires = time.monotonic() + ACCOUNT_INDEX_TTL
+        self._account_index = {(acc.login, acc.server): (acc, expires) for acc in existing_accounts}
+    
+    async def _open_connection(self, login: str, server: str, account):
+        """Open a connection for a login, sharing one attempt among concurrent callers for the same server"""
+        pending = self._connecting.get(login)
+        if pending is not None and pending[0] != server:
+            # Let the other server's open finish first; ours then replaces it
+            await asyncio.gather(pending[1], return_exceptions=True)
+            pending = self._connecting.get(login)
+        
+        if pending is None or pending[0] != server:
+            task = asyncio.ensure_future(self._connect(login, server, account))
+            pending = self._connecting[login] = (server, task)
+            task.add_done_callback(
+                lambda done: self._connecting.pop(login) if self._connecting.get(login, (None, None))[1] is done else None
+            )
+        return await asyncio.shield(pending[1])
+    
+    async def _connect(self, login: str, server: str, account):
+        """Deploy an account and open a synchronized RPC connection, cached by login; streaming starts in the background"""
+        ready = self._ready.setdefault(login, asyncio.Event())
+        self._order_locks.setdefault(login, asyncio.Lock())
+        
+        # Deploy account
+        log.debug("🚀 Deploying account %s", login)
+        await account.deploy()
+        
+        # Wait for deployment
+        log.debug("⏳ Waiting for deployment...")
+        await account.wait_deployed()
+        log.debug("✅ Account deployed")
+        
+        # Connect
+        log.debug("🔌 Connecting to broker...")
+        await account.wait_connected()
+        log.debug("✅ Connected to broker")
+        
+        # Get RPC connection
+        connection = account.get_rpc_connection()
+        await connection.connect()
+        
+        log.debug("⏳ Synchronizing account data...")
+        await connection.wait_synchronized()
+        log.info("✅ Account %s synchronized", login)
+        
+        # Cache account with the connection's bound methods, so hot paths skip attribute lookups
+        previous = self.accounts.get(login)
+        entry = self.accounts[login] = {
+            'account': account,
+            'connection': connection,
+            'streaming': None,
+            'server': server,
+            **{action: getattr(connection, method) for action, method in self._ORDER_DISPATCH.items()},
+            'close': connection.close_position,
+            'get_positions': connection.get_positions,
+            'get_account_information': connection.get_account_information
+        }
+        
+        # Streaming keeps balance and positions in local memory; reads use RPC until it has synced
+        entry['streaming_task'] = asyncio.create_task(self._start_streaming(login, entry))
+        self._failed.pop(login, None)
+        ready.set()
+        
+        # Connections live for the process, so a replaced entry must be closed or it leaks
+        if previous is not None:
+            try:
+                await self._close_connections(previous)
+            except Exception as e:
+                log.debug("Ignoring error closing replaced connection for %s: %s", login, e)
+        return connection
+    
+    async def _start_streaming(self, login: str, entry: Dict) -> None:
+        """Open and sync a streaming connection, attaching it to the entry once usable"""
+        streaming = None
+        try:
+            streaming = entry['account'].get_streaming_connection()
+            await streaming.connect()
+            await streaming.wait_synchronized()
+        except asyncio.CancelledError:
+            await self._discard_stream(streaming)
+            raise
+        except Exception as e:
+            await self._discard_stream(streaming)
+            log.warning("⚠️ Streaming unavailable for %s, reads will use RPC: %s", login, e)
+            return
+        
+        if self.accounts.get(login) is entry:
+            entry['streaming'] = streaming
+            log.debug("📡 Streaming synchronized for %s", login)
+        else:
+            # The connection was replaced or closed while we were syncing
+            await self._discard_stream(streaming)
     
-    async def get_account_info(self, login: str) -> Dict:
-        """Get current account information"""
+    @staticmethod
+    async def _discard_stream(streaming) -> None:
+        """Close a streaming connection that will not be used, ignoring close errors"""
+        if streaming is None:
+            return
         try:
-            if login not in self.accounts:
-                raise Exception("Account not connected. Please connect first.")
-            
-            connection = self.accounts[login]['connection']
-            account_info = await connection.get_account_information()
-            
-            return {
-                'balance': account_info['balance'],
-                'equity': account_info['equity'],
-                'margin': account_info.get('margin', 0),
-                'freeMargin': account_info.get('freeMargin', 0),
-                'currency': account_info.get('currency', 'USD')
-            }
+            await streaming.close()
         except Exception as e:
-            print(f"❌ Error getting account info: {str(e)}")
+            log.debug("Ignoring error closing unused stream: %s", e)
+    
+    async def _ready_account(self, login: str) -> Dict:
+        """Return the cached account entry for a login, waiting out a reconnect in progress"""
+        if login not in self.accounts:
+            raise MetaAPIError("Account not connected")
+        
+        ready = self._ready[login]
+        if not ready.is_set():
+            try:
+                await asyncio.wait_for(ready.wait(), READY_TIMEOUT)
+            except asyncio.TimeoutError as e:
+                raise MetaAPIError("Account is reconnecting, try again shortly") from e
+        
+        error = self._failed.get(login)
+        if error is not None:
+            raise MetaAPIError(f"Account connection lost, reconnect pending: {error}")
+        return self.accounts[login]
+    
+    def _terminal_state(self, entry: Dict):
+        """Return the streamed terminal state of an account entry, or None when reads must go over RPC"""
+        streaming = entry.get('streaming')
+        if streaming is None:
+            return None
+        
+        state = streaming.terminal_state
+        if not state.connected_to_broker or state.account_information is None:
+            return None
+        return state
+    
+    async def _close_connections(self, entry: Dict) -> None:
+        """Close the RPC and streaming connections of a cached account"""
+        task = entry.get('streaming_task')
+        if task is not None and not task.done():
+            task.cancel()
+        for key in ('connection', 'streaming'):
+            if entry.get(key) is not None:
+                await entry[key].close()
+    
+    def start_keepalive(self) -> None:
+        """Start pinging open connections in the background (call once the event loop is running)"""
+        if self._keepalive_task is None or self._keepalive_task.done():
+            self._keepalive_task = asyncio.create_task(self._keepalive_loop())
+    
+    async def _keepalive_loop(self) -> None:
+        """Ping every open connection periodically and reconnect dropped ones out of band"""
+        while True:
+            await asyncio.sleep(KEEPALIVE_INTERVAL)
+            try:
+                await asyncio.gather(*[self._keepalive(login) for login in list(self.accounts)])
+            except Exception as e:
+                log.error("❌ Keepalive pass failed: %s", e)
+    
+    async def _keepalive(self, login: str) -> None:
+        """Ping one connection; on failure hold requests on its ready event and reconnect"""
+        entry = self.accounts.get(login)
+        if entry is None:
+            return
+        try:
+            await entry['get_account_information']()
+            return
+        except Exception as e:
+            log.warning("⚠️ Keepalive failed for %s, reconnecting: %s", login, e)
+        
+        self._ready[login].clear()
+        try:
+            await self._close_connections(entry)
+        except Exception:
+            pass
+        try:
+            await self._open_connection(login, entry['server'], entry['account'])
+            log.info("✅ Reconnected %s", login)
+        except Exception as e:
+            log.error("❌ Reconnect failed for %s, will retry: %s", login, e)
+            # Fail requests now rather than after READY_TIMEOUT; connect_account reconnects inline
+            self._failed[login] = str(e)
+            self._ready[login].set()
+    
+    async def _account_summary(self, connection, login: str) -> AccountInfoDTO:
+        """Fetch account information in the shape returned by connect_account"""
+        info = AccountInfoDTO.from_metaapi(await connection.get_account_information())
+        log.debug("💰 Account %s balance=%.2f equity=%.2f currency=%s", login, info.balance, info.equity, info.currency)
+        return info
+    
+    async def prewarm(self, logins: List[Tuple[str, str]]) -> int:
+        """Open connections for already-deployed accounts before the first request needs them
+        
+        Accounts that are not deployed are skipped rather than deployed, since a
+        deployed MetaAPI account is billed. Returns the number of open connections.
+        """
+        try:
+            await self._refresh_account_index()
+        except Exception as e:
+            log.warning("⚠️ Could not list MetaAPI accounts for prewarm: %s", e)
+            return 0
+        
+        async def warm(login: str, server: str) -> bool:
+            account = self._account_index.get((login, server), (None, 0))[0]
+            if login in self.accounts or account is None or account.state != 'DEPLOYED':
+                return login in self.accounts
+            try:
+                await self._open_connection(login, server, account)
+                return True
+            except Exception as e:
+                log.warning("⚠️ Could not prewarm account %s: %s", login, e)
+                return False
+        
+        results = await asyncio.gather(*[warm(login, server) for login, server in logins])
+        return sum(results)
+    
+    async def close(self):
+        """Stop the keepalive loop and close every cached connection"""
+        if self._keepalive_task:
+            self._keepalive_task.cancel()
+            self._keepalive_task = None
+        
+        for login, entry in list(self.accounts.items()):
+            try:
+                await self._close_connections(entry)
+            except Exception as e:
+                log.warning("⚠️ Error closing connection for %s: %s", login, e)
+        self.accounts.clear()
+        self._ready.clear()
+        self._failed.clear()
+        self._order_locks.clear()
+        self._info_cache.clear()
+        self._info_generation.clear()
+    
+    def _invalidate_info(self, login: str) -> None:
+        """Drop cached account info after a balance-changing action, including any fetch in flight"""
+        self._info_cache.pop(login, None)
+        self._info_generation[login] = self._info_generation.get(login, 0) + 1
+    
+    async def get_account_info(self, login: str, force: bool = False) -> AccountInfoDTO:
+        """Get current account information (reused for INFO_CACHE_TTL unless force=True)"""
+        try:
+            cached = self._info_cache.get(login)
+            if cached and not force and time.monotonic() - cached[0] < INFO_CACHE_TTL:
+                return cached[1]
+            
+            generation = self._info_generation.get(login, 0)
+            entry = await self._ready_account(login)
+            state = self._terminal_state(entry)
+            if state is not None:
+                account_info = state.account_information
+            else:
+                account_info = await entry['get_account_information']()
+            
+            info = AccountInfoDTO.from_metaapi(account_info)
+            # A trade or close while this was in flight makes it stale - return it but don't cache it
+            if self._info_generation.get(login, 0) == generation:
+                self._info_cache[login] = (time.monotonic(), info)
+            return info
+        except Exception as e:
+            log.error("❌ Error getting account info: %s", e)
             raise
     
     async def place_trade(
@@ -137,72 +422,84 @@ class MetaAPIClient:
     ) -> Dict:
         """Place a market order"""
         try:
-            if account_login not in self.accounts:
-                raise Exception("Account not connected")
-            
-            connection = self.accounts[account_login]['connection']
+            entry = await self._ready_account(account_login)
             
-            print(f"\n📊 Executing {action_type.upper()} order:")
-            print(f"   Symbol: {symbol}")
-            print(f"   Volume: {volume} lots")
-            print(f"   SL: {stop_loss if stop_loss else 'None'}")
-            print(f"   TP: {take_profit if take_profit else 'None'}")
+            log.debug("📊 Executing %s %s vol=%.2f sl=%s tp=%s", action_type, symbol, volume, stop_loss, take_profit)
             
             # Place order
-            if action_type.lower() == "buy":
-                result = await connection.create_market_buy_order(
-                    symbol, 
-                    volume,
-                    stop_loss,
-                    take_profit
-                )
-            else:  # sell
-                result = await connection.create_market_sell_order(
-                    symbol,
-                    volume,
-                    stop_loss,
-                    take_profit
-                )
-            
-            print(f"✅ Order executed: ID {result.get('orderId')}")
+            if action_type not in self._ORDER_DISPATCH:
+                raise MetaAPIError(f"Unsupported order type: {action_type}")
+            async with self._order_locks[account_login]:
+                result = await entry[action_type](symbol, volume, stop_loss, take_profit)
+            
+            self._invalidate_info(account_login)
+            log.info("✅ Order executed: ID %s", result.get('orderId'))
             
             return result
             
         except Exception as e:
-            print(f"❌ Error placing trade: {str(e)}")
+            log.error("❌ Error placing trade: %s", e)
             raise
     
     async def get_positions(self, account_login: str) -> List:
         """Get all open positions"""
         try:
-            if account_login not in self.accounts:
-                raise Exception("Account not connected")
+            entry = await self._ready_account(account_login)
+            state = self._terminal_state(entry)
+            if state is not None:
+                return list(state.positions)
             
-            connection = self.accounts[account_login]['connection']
-            positions = await connection.get_positions()
+            positions = await entry['get_positions']()
             
             return positions
             
         except Exception as e:
-            print(f"❌ Error getting positions: {str(e)}")
+            log.error("❌ Error getting positions: %s", e)
             raise
     
     async def close_position(self, account_login: str, position_id: str) -> Dict:
         """Close a specific position"""
         try:
-            if account_login not in self.accounts:
-                raise Exception("Account not connected")
+            entry = await self._ready_account(account_login)
             
-            connection = self.accounts[account_login]['connection']
-            
-            print(f"🔒 Closing position: {position_id}")
-            result = await connection.close_position(position_id)
-            print(f"✅ Position closed")
+            log.info("🔒 Closing position: %s", position_id)
+            async with self._order_locks[account_login]:
+                result = await entry['close'](position_id)
+            self._invalidate_info(account_login)
+            log.info("✅ Position %s closed", position_id)
             
             return result
             
         except Exception as e:
-            print(f"❌ Error closing position: {str(e)}")
+            log.error("❌ Error closing position: %s", e)
             raise
+    
+    async def close_positions(self, account_login: str, position_ids: List[str]) -> List[Dict]:
+        """Close several positions concurrently
+        
+        Returns one {'id', 'ok', 'error'} dict per position, in input order; a failed
+        close is reported in its entry rather than aborting the rest.
+        """
+        entry = await self._ready_account(account_login)
+        close = entry['close']
+        limit = asyncio.Semaphore(CLOSE_CONCURRENCY)
+        
+        async def close_one(position_id: str):
+            async with limit:
+                return await close(position_id)
+        
+        log.info("🔒 Closing %d positions for %s", len(position_ids), account_login)
+        async with self._order_locks[account_login]:
+            results = await asyncio.gather(*[close_one(pid) for pid in position_ids], return_exceptions=True)
+        self._invalidate_info(account_login)
+        
+        outcome = [
+            {'id': pid, 'ok': not isinstance(result, BaseException), 'error': str(result) if isinstance(result, BaseException) else None}
+            for pid, result in zip(position_ids, results)
+        ]
+        failed = sum(not o['ok'] for o in outcome)
+        if failed:
+            log.warning("⚠️ %d of %d closes failed for %s", failed, len(position_ids), account_login)
+        return outcome
 
-print("🔌 MetaAPI client module loaded")
\ No newline at end of file
+log.debug("🔌 MetaAPI client module loaded")
\ No newline at end of file
@@ -2,12 +2,15 @@
 # FILENAME: backend/models.py
 # ============================================
 
-from pydantic import BaseModel, Field
-from typing import Optional, List
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Literal, Optional, List
 from datetime import datetime
 
 # ==================== Pydantic Models (API Request/Response) ====================
 
+# Response models are immutable and drop unknown keys; trusted data can skip validation via model_construct
+RESPONSE_CONFIG = ConfigDict(extra='ignore', frozen=True)
+
 class BrokerConnect(BaseModel):
     login: str = Field(..., description="MT5 account number")
     password: str = Field(..., description="MT5 password")
@@ -20,15 +23,23 @@ class TradeRequest(BaseModel):
     user_id: str = Field(..., description="User ID")
     symbol: str = Field(..., description="Trading symbol (e.g., EURUSD)")
     volume: float = Field(..., description="Trade volume in lots")
-    type: str = Field(..., description="Trade type: buy or sell")
+    type: Literal["buy", "sell"] = Field(..., description="Trade type: buy or sell")
     stop_loss: Optional[float] = Field(None, description="Stop loss price")
     take_profit: Optional[float] = Field(None, description="Take profit price")
+    
+    @field_validator("type", mode="before")
+    @classmethod
+    def normalize_type(cls, value):
+        """Accept any case, as "Buy"/"Sell" are stored on positions"""
+        return value.lower() if isinstance(value, str) else value
 
 class ClosePositionRequest(BaseModel):
     user_id: str = Field(..., description="User ID")
     position_id: str = Field(..., description="Position ID")
 
 class UserResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+    
     id: str
     broker_account: str
     server: str
@@ -40,6 +51,8 @@ class UserResponse(BaseModel):
     last_login: Optional[datetime]
 
 class PositionResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+    
     id: str
     user_id: str
     symbol: str
@@ -55,6 +68,8 @@ class PositionResponse(BaseModel):
     closed_at: Optional[datetime]
 
 class OrderResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+    
     id: str
     user_id: str
     symbol: str
@@ -66,6 +81,8 @@ class OrderResponse(BaseModel):
     executed_at: Optional[datetime]
 
 class NewsResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+    
     id: str
     title: str
     content: str
@@ -75,6 +92,8 @@ class NewsResponse(BaseModel):
     image_url: Optional[str]
 
 class AccountInfoResponse(BaseModel):
+    model_config = ConfigDict(**RESPONSE_CONFIG, from_attributes=True)
+    
     user_id: str
     broker_account: str
     server: str
@@ -85,5 +104,7 @@ class AccountInfoResponse(BaseModel):
     currency: str
 
 class ErrorResponse(BaseModel):
+    model_config = RESPONSE_CONFIG
+    
     error: str
     details: Optional[str] = None
\ No newline at end of file
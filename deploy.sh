@@ -15,6 +15,7 @@ if [ ! -f .env ]; then
     echo "APPWRITE_API_KEY=your_api_key"
     echo "METAAPI_TOKEN=your_metaapi_token"
     echo "ENCRYPTION_KEY=your_encryption_key"
+    echo "FRONTEND_ORIGIN=https://your-frontend.example.com  # optional, comma-separated; defaults to http://localhost:8000"
     exit 1
 fi
 